@@ -0,0 +1,107 @@
+#
+# Batch execution of circuits built with circuit.py on the local simulator, the qiskit simulator or a real quantum machine.
+# executor() returns a function that takes a list of circuits and returns a list of counts, one per circuit.
+# The function also records the backend name (execute.backend) and, on real devices, the time of the device's last calibration (execute.calibrated).
+# The noisy simulator records the readout error it applies (execute.readoutError); other backends leave it as None.
+# Every backend records the physical qubit measured into each clbit of the last batch (execute.measured), as the transpiler may move qubits with swaps on a device.
+# The local simulators share a prefix cache across batches (execute.cache), so repeated circuits resume from their cached states.
+# Devices also record their qubit count and coupling map (execute.numQubits, execute.couplingMap); simulators leave these as None, as any qubits may interact.
+#
+# With trivialLayout, qubit i of each circuit runs on physical qubit i of the device, for circuits that were already placed on the coupling map.
+#
+
+import ast
+from configparser import RawConfigParser
+import numpy as np
+from circuit import OPCODES
+import statevector
+import mps
+
+def measuredQubits(program):
+  # The qubit measured into each clbit of a circuit built with circuit.py (-1 where a clbit is never measured).
+  measured = np.full(program.numClbits, -1, dtype=np.int32)
+  rows = program.ops == OPCODES['measure']
+  measured[program.clbits[rows]] = program.qubits[rows, 0]
+  return measured
+
+def physicalQubits(program):
+  # The physical qubit measured into each clbit of a transpiled qiskit circuit.
+  measured = np.full(len(program.clbits), -1, dtype=np.int32)
+  for instruction, qargs, cargs in program.data:
+    if instruction.name == 'measure':
+      measured[cargs[0].index] = qargs[0].index
+  return measured
+
+def executor(type, shots = 1, readoutError = [0.02, 0.05], trivialLayout = False):
+  # Return a function that executes a batch of circuits on the selected backend and returns their counts.
+  if type == 'sim' or type == 'noisy' or type == 'mps':
+    noise = readoutError if type == 'noisy' else None
+    cache = statevector.PrefixCache() if type != 'mps' else None
+
+    def execute(circuits):
+      # The simulators have no layout, so qubit i is physical qubit i.
+      execute.measured = [measuredQubits(program) for program in circuits]
+      if type == 'mps':
+        return [mps.execute(program, shots) for program in circuits]
+      return [statevector.execute(program, shots, noise, cache = cache) for program in circuits]
+
+    execute.backend = type
+    execute.cache = cache
+    execute.calibrated = None
+    execute.readoutError = noise
+    execute.measured = None
+    execute.numQubits = None
+    execute.couplingMap = None
+    return execute
+
+  import qiskit
+  if type == 'real':
+    # Setup the API key for the real quantum computer.
+    parser = RawConfigParser()
+    parser.read('config.ini')
+
+    # Read configuration values.
+    proxies = ast.literal_eval(parser.get('IBM', 'proxies')) if parser.has_option('IBM', 'proxies') else None
+    verify = (True if parser.get('IBM', 'verify') == 'True' else False) if parser.has_option('IBM', 'verify') else True
+    token = parser.get('IBM', 'key')
+
+    qiskit.IBMQ.enable_account(token = token, proxies = proxies, verify = verify)
+
+    # Set the backend server.
+    backend = qiskit.providers.ibmq.least_busy(qiskit.IBMQ.backends(simulator=False))
+    print("Running on", backend.name())
+  else:
+    backend = qiskit.Aer.get_backend('qasm_simulator')
+    print("Running on the simulator.")
+
+  # Devices limit the number of circuits in one job.
+  configuration = backend.configuration()
+  limit = getattr(configuration, 'max_experiments', None)
+
+  def execute(circuits):
+    # Submit the batch as a single job, or as several when it is larger than the backend allows.
+    # The circuits are transpiled here rather than in qiskit.execute, to read which physical qubit each clbit was measured on.
+    execute.measured = []
+    if not circuits:
+      return []
+    programs = [program.toCircuit() for program in circuits]
+    size = limit or len(programs)
+    counts = []
+    for i in range(0, len(programs), size):
+      # One layout per circuit, as the circuits in a batch may have different widths.
+      layout = { 'initial_layout': [list(range(program.numQubits)) for program in circuits[i:i + size]] } if trivialLayout else {}
+      compiled = qiskit.transpile(programs[i:i + size], backend, **layout)
+      result = backend.run(qiskit.assemble(compiled, backend, shots=shots)).result()
+      counts += [result.get_counts(program) for program in compiled]
+      execute.measured += [physicalQubits(program) for program in compiled]
+    return counts
+
+  execute.backend = backend.name()
+  execute.cache = None
+  properties = backend.properties() if type == 'real' else None
+  execute.calibrated = str(properties.last_update_date) if properties else None
+  execute.readoutError = None
+  execute.measured = None
+  execute.numQubits = configuration.n_qubits if type == 'real' else None
+  execute.couplingMap = configuration.coupling_map if type == 'real' else None
+  return execute
@@ -0,0 +1,551 @@
+#
+# A compact circuit representation for building large quantum programs quickly.
+# Instead of allocating a qiskit instruction object for every gate, a circuit is stored as parallel NumPy arrays of opcodes, qubit operands, classical bits and parameters.
+# Whole layers of gates are appended with a single call, and circuits convert to and from QuantumCircuit and QASM when it is time to run them.
+#
+# Example:
+#   program = Circuit(4, 4)
+#   program.h(range(4))
+#   program.cccz([0, 1, 2, 3])
+#   program.measure(range(4), range(4))
+#   qc = program.toCircuit()
+#
+# python3 circuit.py
+#
+
+import ast
+import operator
+import re
+import time
+import numpy as np
+
+# Supported gates in opcode order, with the number of qubits and parameters each gate takes.
+GATES = [
+  ('id', 1, 0),
+  ('x', 1, 0),
+  ('y', 1, 0),
+  ('z', 1, 0),
+  ('h', 1, 0),
+  ('s', 1, 0),
+  ('sdg', 1, 0),
+  ('t', 1, 0),
+  ('tdg', 1, 0),
+  ('u1', 1, 1),
+  ('u2', 1, 2),
+  ('u3', 1, 3),
+  ('cx', 2, 0),
+  ('cz', 2, 0),
+  ('cu1', 2, 1),
+  ('swap', 2, 0),
+  ('ccx', 3, 0),
+  ('measure', 1, 0),
+  ('barrier', 0, 0)
+]
+
+NAMES = [name for name, arity, params in GATES]
+OPCODES = { name: i for i, name in enumerate(NAMES) }
+ARITY = np.array([arity for name, arity, params in GATES], dtype=np.int8)
+PARAMS = np.array([params for name, arity, params in GATES], dtype=np.int8)
+
+# Maximum number of qubit operands and parameters of any gate (the width of the operand and parameter arrays).
+MAX_QUBITS = 3
+MAX_PARAMS = 3
+
+# The triple controlled Pauli Z-gate (cccZ) used by Grover's search in search.py, as (gate, parameter, operands) on a block of 4 qubits.
+CCCZ = [
+  ('cu1', np.pi / 4, (0, 3)),
+  ('cx', 0, (0, 1)),
+  ('cu1', -np.pi / 4, (1, 3)),
+  ('cx', 0, (0, 1)),
+  ('cu1', np.pi / 4, (1, 3)),
+  ('cx', 0, (1, 2)),
+  ('cu1', -np.pi / 4, (2, 3)),
+  ('cx', 0, (0, 2)),
+  ('cu1', np.pi / 4, (2, 3)),
+  ('cx', 0, (1, 2)),
+  ('cu1', -np.pi / 4, (2, 3)),
+  ('cx', 0, (0, 2)),
+  ('cu1', np.pi / 4, (2, 3))
+]
+
+# Operators allowed in QASM gate parameters.
+OPERATORS = {
+  ast.Add: operator.add,
+  ast.Sub: operator.sub,
+  ast.Mult: operator.mul,
+  ast.Div: operator.truediv,
+  ast.Pow: operator.pow,
+  ast.UAdd: operator.pos,
+  ast.USub: operator.neg
+}
+
+def evaluate(expression):
+  # Evaluate a QASM parameter such as -pi/4, allowing only numbers, pi, + - * / ** and parentheses.
+  def visit(node):
+    if isinstance(node, ast.Expression):
+      return visit(node.body)
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+      return float(node.value)
+    elif isinstance(node, ast.Name) and node.id == 'pi':
+      return np.pi
+    elif isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+      return OPERATORS[type(node.op)](visit(node.left), visit(node.right))
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in OPERATORS:
+      return OPERATORS[type(node.op)](visit(node.operand))
+    raise ValueError('Unsupported parameter in QASM: ' + expression)
+
+  try:
+    return visit(ast.parse(expression.strip(), mode='eval'))
+  except (SyntaxError, ArithmeticError):
+    raise ValueError('Unsupported parameter in QASM: ' + expression)
+
+class Gate:
+  # A lightweight view of a single gate in a circuit.
+  __slots__ = ('name', 'qubits', 'params', 'clbit')
+
+  def __init__(self, name, qubits, params, clbit):
+    self.name = name
+    self.qubits = qubits
+    self.params = params
+    self.clbit = clbit
+
+  def __repr__(self):
+    return 'Gate(' + self.name + ', ' + str(self.qubits) + ', ' + str(self.params) + (', ' + str(self.clbit) if self.clbit >= 0 else '') + ')'
+
+class Circuit:
+  # A quantum circuit stored as parallel arrays: one row per gate, unused operands and clbits set to -1.
+  __slots__ = ('numQubits', 'numClbits', 'size', '_ops', '_qubits', '_clbits', '_params')
+
+  def __init__(self, numQubits, numClbits = 0, capacity = 64):
+    self.numQubits = numQubits
+    self.numClbits = numClbits
+    self.size = 0
+    self._ops = np.empty(capacity, dtype=np.uint8)
+    self._qubits = np.empty((capacity, MAX_QUBITS), dtype=np.int32)
+    self._clbits = np.empty(capacity, dtype=np.int32)
+    self._params = np.empty((capacity, MAX_PARAMS), dtype=np.float64)
+
+  @property
+  def ops(self):
+    return self._ops[:self.size]
+
+  @property
+  def qubits(self):
+    return self._qubits[:self.size]
+
+  @property
+  def clbits(self):
+    return self._clbits[:self.size]
+
+  @property
+  def params(self):
+    return self._params[:self.size]
+
+  def __len__(self):
+    return self.size
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += self.size
+    if i < 0 or i >= self.size:
+      raise IndexError('gate index out of range')
+
+    op = self._ops[i]
+    return Gate(NAMES[op], tuple(self._qubits[i, :ARITY[op]].tolist()), tuple(self._params[i, :PARAMS[op]].tolist()), int(self._clbits[i]))
+
+  def __iter__(self):
+    for i in range(self.size):
+      yield self[i]
+
+  def __repr__(self):
+    return 'Circuit(' + str(self.numQubits) + ' qubits, ' + str(self.numClbits) + ' clbits, ' + str(self.size) + ' gates)'
+
+  def _reserve(self, count):
+    # Grow the arrays (doubling) so that count more gates fit.
+    required = self.size + count
+    capacity = len(self._ops)
+    if required <= capacity:
+      return
+
+    capacity = max(capacity * 2, required)
+    for name in ['_ops', '_qubits', '_clbits', '_params']:
+      old = getattr(self, name)
+      new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+      new[:self.size] = old[:self.size]
+      setattr(self, name, new)
+
+  def _append(self, ops, qubits, params, clbits):
+    # Append whole rows at once; qubits is (count, MAX_QUBITS), params is (count, MAX_PARAMS).
+    count = len(ops)
+    self._reserve(count)
+    end = self.size + count
+    self._ops[self.size:end] = ops
+    self._qubits[self.size:end] = qubits
+    self._params[self.size:end] = params
+    self._clbits[self.size:end] = clbits
+    self.size = end
+    return self
+
+  def _check(self, values, limit, kind):
+    if values.size and (values.min() < 0 or values.max() >= limit):
+      raise ValueError(kind + ' index out of range for circuit with ' + str(limit) + ' ' + kind + 's')
+
+  def layer(self, name, qubits, params = None, clbits = None):
+    # Append one gate per row of qubits. For single qubit gates, qubits may be an int or a list of qubits; for multi-qubit gates, it is a list of rows of operands.
+    # Parameters broadcast against the number of gates, so a whole layer of u3 gates can share or vary its angles.
+    if not name in OPCODES:
+      raise ValueError('Unsupported gate: ' + name)
+    op = OPCODES[name]
+    arity = int(ARITY[op])
+    if arity == 0:
+      raise ValueError('Use barrier() to add a ' + name)
+
+    operands = np.asarray(qubits, dtype=np.int32).reshape(-1, arity)
+    count = len(operands)
+    if count == 0:
+      return self
+
+    self._check(operands, self.numQubits, 'qubit')
+    if (arity > 1 and np.any(operands[:, 1:] == operands[:, :1])) or (arity > 2 and np.any(operands[:, 1] == operands[:, 2])):
+      raise ValueError('Duplicate qubit operands for ' + name)
+
+    rows = np.full((count, MAX_QUBITS), -1, dtype=np.int32)
+    rows[:, :arity] = operands
+
+    values = np.zeros((count, MAX_PARAMS), dtype=np.float64)
+    if PARAMS[op]:
+      values[:, :PARAMS[op]] = np.broadcast_to(np.asarray(params, dtype=np.float64).reshape(-1, PARAMS[op]), (count, PARAMS[op]))
+
+    if name == 'measure':
+      clbits = np.broadcast_to(np.asarray(clbits, dtype=np.int32).reshape(-1), (count,))
+      self._check(clbits, self.numClbits, 'clbit')
+    else:
+      clbits = -1
+
+    return self._append(np.full(count, op, dtype=np.uint8), rows, values, clbits)
+
+  def _pairs(self, a, b):
+    # Pair up two lists of qubits (either may be a single qubit) into rows of operands.
+    return np.column_stack(np.broadcast_arrays(np.atleast_1d(np.asarray(a, dtype=np.int32)), np.atleast_1d(np.asarray(b, dtype=np.int32))))
+
+  def id(self, qubits):
+    return self.layer('id', qubits)
+
+  def x(self, qubits):
+    return self.layer('x', qubits)
+
+  def y(self, qubits):
+    return self.layer('y', qubits)
+
+  def z(self, qubits):
+    return self.layer('z', qubits)
+
+  def h(self, qubits):
+    return self.layer('h', qubits)
+
+  def s(self, qubits):
+    return self.layer('s', qubits)
+
+  def sdg(self, qubits):
+    return self.layer('sdg', qubits)
+
+  def t(self, qubits):
+    return self.layer('t', qubits)
+
+  def tdg(self, qubits):
+    return self.layer('tdg', qubits)
+
+  def u1(self, lam, qubits):
+    return self.layer('u1', qubits, lam)
+
+  def u2(self, phi, lam, qubits):
+    return self.layer('u2', qubits, np.column_stack(np.broadcast_arrays(phi, lam)))
+
+  def u3(self, theta, phi, lam, qubits):
+    return self.layer('u3', qubits, np.column_stack(np.broadcast_arrays(theta, phi, lam)))
+
+  def cx(self, controls, targets):
+    return self.layer('cx', self._pairs(controls, targets))
+
+  def cz(self, controls, targets):
+    return self.layer('cz', self._pairs(controls, targets))
+
+  def cu1(self, lam, controls, targets):
+    return self.layer('cu1', self._pairs(controls, targets), lam)
+
+  def swap(self, a, b):
+    return self.layer('swap', self._pairs(a, b))
+
+  def ccx(self, a, b, targets):
+    a, b, targets = np.broadcast_arrays(np.atleast_1d(a), np.atleast_1d(b), np.atleast_1d(targets))
+    return self.layer('ccx', np.column_stack([a, b, targets]))
+
+  def measure(self, qubits, clbits):
+    return self.layer('measure', qubits, clbits = clbits)
+
+  def barrier(self):
+    # A barrier always spans every qubit in the circuit.
+    return self._append(np.array([OPCODES['barrier']], dtype=np.uint8), np.full((1, MAX_QUBITS), -1, dtype=np.int32), np.zeros((1, MAX_PARAMS)), -1)
+
+  def _template(self, template, blocks):
+    # Stamp a fixed sequence of gates onto every block of qubits in one pass.
+    blocks = np.atleast_2d(np.asarray(blocks, dtype=np.int32))
+    self._check(blocks, self.numQubits, 'qubit')
+    ordered = np.sort(blocks, axis=1)
+    if np.any(ordered[:, 1:] == ordered[:, :-1]):
+      raise ValueError('Duplicate qubit operands in block')
+    count = len(blocks) * len(template)
+
+    ops = np.array([OPCODES[name] for name, param, operands in template], dtype=np.uint8)
+    operands = np.array([operands for name, param, operands in template], dtype=np.int32)
+    values = np.array([param for name, param, operands in template], dtype=np.float64)
+
+    rows = np.full((count, MAX_QUBITS), -1, dtype=np.int32)
+    rows[:, :operands.shape[1]] = blocks[:, operands].reshape(count, -1)
+    params = np.zeros((count, MAX_PARAMS), dtype=np.float64)
+    params[:, 0] = np.tile(values, len(blocks))
+
+    return self._append(np.tile(ops, len(blocks)), rows, params, -1)
+
+  def cccz(self, blocks):
+    # Apply the triple controlled Pauli Z-gate to a block of 4 qubits, or to every row of a list of blocks.
+    return self._template(CCCZ, blocks)
+
+  def copy(self):
+    program = Circuit(self.numQubits, self.numClbits, max(self.size, 1))
+    return program._append(self.ops, self.qubits, self.params, self.clbits)
+
+  def compose(self, other, qubits = None, clbits = None):
+    # Append the gates of another circuit, placing its qubit i on qubits[i] and its clbit j on clbits[j]. Barriers still span every qubit.
+    qubitMap = np.arange(other.numQubits, dtype=np.int32) if qubits is None else np.asarray(qubits, dtype=np.int32)
+    clbitMap = np.arange(other.numClbits, dtype=np.int32) if clbits is None else np.asarray(clbits, dtype=np.int32)
+    if len(qubitMap) != other.numQubits or len(clbitMap) != other.numClbits:
+      raise ValueError('compose needs one qubit and clbit for each of the circuit\'s ' + str(other.numQubits) + ' qubits and ' + str(other.numClbits) + ' clbits')
+    self._check(qubitMap, self.numQubits, 'qubit')
+    self._check(clbitMap, self.numClbits, 'clbit')
+
+    rows = other.qubits.copy()
+    rows[rows >= 0] = qubitMap[rows[rows >= 0]]
+    measured = other.clbits.copy()
+    measured[measured >= 0] = clbitMap[measured[measured >= 0]]
+
+    return self._append(other.ops, rows, other.params, measured)
+
+  def countOps(self):
+    # Count the gates of each type in the circuit.
+    counts = np.bincount(self.ops, minlength=len(NAMES))
+    return { NAMES[op]: int(counts[op]) for op in np.nonzero(counts)[0] }
+
+  def toQasm(self):
+    # Render the circuit as an OpenQASM 2.0 program.
+    lines = ['OPENQASM 2.0;', 'include "qelib1.inc";', 'qreg q[' + str(self.numQubits) + '];']
+    if self.numClbits:
+      lines.append('creg c[' + str(self.numClbits) + '];')
+
+    allQubits = ','.join('q[' + str(q) + ']' for q in range(self.numQubits))
+    for op, qubits, params, clbit in zip(self.ops.tolist(), self.qubits.tolist(), self.params.tolist(), self.clbits.tolist()):
+      name = NAMES[op]
+      if name == 'measure':
+        lines.append('measure q[' + str(qubits[0]) + '] -> c[' + str(clbit) + '];')
+      elif name == 'barrier':
+        lines.append('barrier ' + allQubits + ';')
+      else:
+        args = '(' + ','.join(repr(p) for p in params[:PARAMS[op]]) + ')' if PARAMS[op] else ''
+        lines.append(name + args + ' ' + ','.join('q[' + str(q) + ']' for q in qubits[:ARITY[op]]) + ';')
+
+    return '\n'.join(lines) + '\n'
+
+  @staticmethod
+  def fromQasm(qasm):
+    # Parse an OpenQASM 2.0 program using the gates above. Multiple registers are flattened in declaration order, and barriers span every qubit.
+    qregs = {}
+    cregs = {}
+    numQubits = 0
+    numClbits = 0
+    ops = []
+    qubits = []
+    params = []
+    clbits = []
+
+    def resolve(arg, registers):
+      # Return the flat indices referenced by an argument such as q[2] or q.
+      match = re.fullmatch(r'(\w+)(?:\[(\d+)\])?', arg.strip())
+      if not match or not match.group(1) in registers:
+        raise ValueError('Unknown register in QASM: ' + arg)
+      offset, size = registers[match.group(1)]
+      if match.group(2) is None:
+        return list(range(offset, offset + size))
+      if int(match.group(2)) >= size:
+        raise ValueError('Index out of range for register of size ' + str(size) + ' in QASM: ' + arg)
+      return [offset + int(match.group(2))]
+
+    qasm = re.sub(r'//.*', '', qasm)
+    for statement in qasm.split(';'):
+      statement = ' '.join(statement.split())
+      if not statement or statement.startswith('OPENQASM') or statement.startswith('include'):
+        continue
+
+      match = re.fullmatch(r'(qreg|creg) (\w+)\[(\d+)\]', statement)
+      if match:
+        size = int(match.group(3))
+        if match.group(1) == 'qreg':
+          qregs[match.group(2)] = (numQubits, size)
+          numQubits += size
+        else:
+          cregs[match.group(2)] = (numClbits, size)
+          numClbits += size
+        continue
+
+      match = re.fullmatch(r'measure (.+?) ?-> ?(.+)', statement)
+      if match:
+        sources = resolve(match.group(1), qregs)
+        targets = resolve(match.group(2), cregs)
+        if len(sources) != len(targets):
+          raise ValueError('Mismatched measure in QASM: ' + statement)
+        for q, c in zip(sources, targets):
+          ops.append(OPCODES['measure'])
+          qubits.append([q, -1, -1])
+          params.append([0.0, 0.0, 0.0])
+          clbits.append(c)
+        continue
+
+      match = re.fullmatch(r'(\w+) ?(?:\((.*)\))? ?(.*)', statement)
+      name = match.group(1)
+      if name == 'iden':
+        name = 'id'
+      if not name in OPCODES:
+        raise ValueError('Unsupported gate in QASM: ' + name)
+
+      op = OPCODES[name]
+      if name == 'barrier':
+        ops.append(op)
+        qubits.append([-1, -1, -1])
+        params.append([0.0, 0.0, 0.0])
+        clbits.append(-1)
+        continue
+
+      values = [evaluate(p) for p in match.group(2).split(',')] if match.group(2) else []
+      if len(values) != PARAMS[op]:
+        raise ValueError('Wrong number of parameters in QASM: ' + statement)
+
+      # Whole register arguments broadcast the gate across the register.
+      args = [resolve(arg, qregs) for arg in match.group(3).split(',')]
+      if len(args) != ARITY[op]:
+        raise ValueError('Wrong number of qubits in QASM: ' + statement)
+      width = max(len(arg) for arg in args)
+      if any(len(arg) != 1 and len(arg) != width for arg in args):
+        raise ValueError('Mismatched register sizes in QASM: ' + statement)
+      for i in range(width):
+        ops.append(op)
+        qubits.append([arg[i if len(arg) > 1 else 0] for arg in args] + [-1] * (MAX_QUBITS - len(args)))
+        params.append(values + [0.0] * (MAX_PARAMS - len(values)))
+        clbits.append(-1)
+
+    program = Circuit(numQubits, numClbits, max(len(ops), 1))
+    if ops:
+      # Apply the same checks as layer() to the parsed rows.
+      ops = np.array(ops, dtype=np.uint8)
+      qubits = np.array(qubits, dtype=np.int32)
+      clbits = np.array(clbits, dtype=np.int32)
+      program._check(qubits[qubits >= 0], numQubits, 'qubit')
+      program._check(clbits[ops == OPCODES['measure']], numClbits, 'clbit')
+      ordered = np.sort(qubits, axis=1)
+      duplicate = np.any((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, :-1] >= 0), axis=1)
+      if np.any(duplicate):
+        raise ValueError('Duplicate qubit operands for ' + NAMES[ops[np.argmax(duplicate)]] + ' in QASM')
+      program._append(ops, qubits, np.array(params, dtype=np.float64), clbits)
+    return program
+
+  def toCircuit(self):
+    # Build the equivalent qiskit QuantumCircuit.
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+
+    qr = QuantumRegister(self.numQubits)
+    cr = ClassicalRegister(self.numClbits) if self.numClbits else None
+    program = QuantumCircuit(qr, cr) if cr else QuantumCircuit(qr)
+
+    for op, qubits, params, clbit in zip(self.ops.tolist(), self.qubits.tolist(), self.params.tolist(), self.clbits.tolist()):
+      name = NAMES[op]
+      if name == 'measure':
+        program.measure(qr[qubits[0]], cr[clbit])
+      elif name == 'barrier':
+        program.barrier(qr)
+      else:
+        # Older versions of qiskit name the identity gate iden.
+        gate = getattr(program, 'iden') if name == 'id' and hasattr(program, 'iden') else getattr(program, name)
+        gate(*params[:PARAMS[op]], *[qr[q] for q in qubits[:ARITY[op]]])
+
+    return program
+
+  @staticmethod
+  def fromCircuit(program):
+    # Convert a qiskit QuantumCircuit through its QASM representation.
+    if hasattr(program, 'qasm'):
+      qasm = program.qasm()
+    else:
+      from qiskit import qasm2
+      qasm = qasm2.dumps(program)
+
+    return Circuit.fromQasm(qasm)
+
+def asCircuit(program):
+  # Accept either a Circuit or a qiskit QuantumCircuit.
+  return program if isinstance(program, Circuit) else Circuit.fromCircuit(program)
+
+def benchmark(sizes = [100000, 1000000], width = 20):
+  # Compare the time to construct circuits of the given number of gates: whole layers at once, one gate per call, and one qiskit instruction per gate.
+  qubits = np.arange(width)
+  controls = qubits[0::2]
+  targets = qubits[1::2]
+  layerSize = width + len(controls)
+
+  try:
+    from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
+  except ImportError:
+    QuantumCircuit = None
+
+  for size in sizes:
+    layers = size // layerSize
+
+    # Whole layers: a Hadamard layer followed by a layer of CNOTs.
+    start = time.time()
+    program = Circuit(width, width)
+    for i in range(layers):
+      program.h(qubits)
+      program.cx(controls, targets)
+    program.measure(qubits, qubits)
+    layered = time.time() - start
+
+    # One gate per call, the way the example programs build circuits.
+    start = time.time()
+    program = Circuit(width, width)
+    for i in range(layers):
+      for q in range(width):
+        program.h(q)
+      for c, t in zip(controls, targets):
+        program.cx(c, t)
+    for q in range(width):
+      program.measure(q, q)
+    single = time.time() - start
+
+    print(str(program.size) + " gates: layered " + str(round(layered, 3)) + "s, per gate " + str(round(single, 3)) + "s", end='')
+
+    if QuantumCircuit:
+      start = time.time()
+      qr = QuantumRegister(width)
+      cr = ClassicalRegister(width)
+      qc = QuantumCircuit(qr, cr)
+      for i in range(layers):
+        for q in range(width):
+          qc.h(qr[q])
+        for c, t in zip(controls, targets):
+          qc.cx(qr[int(c)], qr[int(t)])
+      for q in range(width):
+        qc.measure(qr[q], cr[q])
+      print(", qiskit " + str(round(time.time() - start, 3)) + "s")
+    else:
+      print(", qiskit not installed")
+
+if __name__ == '__main__':
+  print("Circuit construction time on 20 qubits.")
+  benchmark()
@@ -8,8 +8,9 @@ from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
 from qiskit import IBMQ
 import numpy as np
 from configparser import RawConfigParser
+import mps
 
-type = 'sim' # Run program on the simulator or real quantum machine.
+type = 'sim' # Run program on the simulator, the matrix product state simulator (mps), or real quantum machine.
 
 def run(program, type, shots = 100):
   if type == 'real':
@@ -27,6 +28,12 @@ def run(program, type, shots = 100):
     print("Running on", backend.name())
     job = qiskit.execute(program, backend)
     return job.result().get_counts()
+  elif type == 'mps':
+    # Execute the program in the matrix product state simulator, suited to wide circuits with little entanglement.
+    print("Running on the MPS simulator.")
+    counts = mps.execute(program, shots)
+    print("Truncation error " + str(mps.execute.state.truncationError) + " at bond dimension " + str(mps.execute.state.maxBondUsed) + ".")
+    return counts
   else:
     # Execute the program in the simulator.
     print("Running on the simulator.")
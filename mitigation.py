@@ -0,0 +1,187 @@
+#
+# Readout error mitigation.
+# Measurements on a real quantum computer are noisy: a qubit in state 1 is sometimes read as 0 and vice versa, as seen in the real device results quoted in deutsch_jozsa.py.
+# Rather than re-running a program until the noise happens to favour the right answer (as search.py does), we measure the readout errors once and correct the counts.
+#
+# Calibration prepares every qubit in 0 and then in 1 (two circuits, a tensored calibration) and records a 2x2 assignment matrix per qubit: A[q][measured][prepared].
+# The matrices are cached on disk per backend and calibration period, so calibration circuits only run again when the device is re-calibrated (or the period expires).
+# The calibration circuits have no two qubit gates, so with a trivial layout they calibrate physical qubits 0..n-1 (every qubit of a real device).
+# The transpiler may still move the qubits of the programs being corrected with swaps, so each clbit is corrected with the matrix of the physical qubit it was measured on (execute.measured).
+# Counts are corrected by applying the least squares inverse of each qubit's matrix and projecting the result back onto the nearest probability distribution, for a whole batch of results at once.
+#
+# python3 mitigation.py
+#
+
+import hashlib
+import os
+import re
+import time
+import numpy as np
+from circuit import Circuit
+from backends import executor
+
+type = 'noisy' # Run program on the simulator with readout noise (noisy) or real quantum machine (real).
+shots = 1024 # Number of measurements (shots) per program execution.
+trials = 50 # Number of secret keys to search for, with and without mitigation.
+maxRuns = 100 # Give up on a key after this many runs.
+
+# Readout errors [p(1|0), p(0|1)] for each qubit of the noisy simulator.
+READOUT_ERROR = [[0.12, 0.38], [0.08, 0.42], [0.10, 0.36], [0.09, 0.45]]
+
+def calibrationCircuits(numQubits):
+  # Prepare all qubits in 0, and all qubits in 1, then measure.
+  zeros = Circuit(numQubits, numQubits)
+  zeros.measure(range(numQubits), range(numQubits))
+
+  ones = Circuit(numQubits, numQubits)
+  ones.x(range(numQubits))
+  ones.measure(range(numQubits), range(numQubits))
+
+  return [zeros, ones]
+
+def toKeys(counts, numBits):
+  # The keys of a counts dictionary without register spaces, checked against the number of bits.
+  keys = [key.replace(' ', '') for key in counts.keys()]
+  if any(len(key) != numBits for key in keys):
+    raise ValueError('Counts do not match the ' + str(numBits) + ' calibrated bits')
+  return keys
+
+def toArrays(counts, numBits):
+  # Convert a counts dictionary into outcome values and their counts; clbit 0 is the right-most bit of a key.
+  keys = toKeys(counts, numBits)
+  return np.array([int(key, 2) for key in keys], dtype=np.int64), np.array(list(counts.values()), dtype=np.float64)
+
+def probabilityOfOne(counts, numBits):
+  # Return the fraction of shots each bit was measured as 1. The calibration covers every qubit of a device, so keys may be wider than 64 bits.
+  keys = toKeys(counts, numBits)
+  bits = np.frombuffer(''.join(keys).encode(), dtype=np.uint8).reshape(len(keys), numBits)[:, ::-1] - ord('0')
+  weights = np.array(list(counts.values()), dtype=np.float64)
+  return weights @ bits / weights.sum()
+
+def calibrate(execute, numQubits):
+  # Run the calibration circuits and return the assignment matrices, shape (numQubits, 2, 2).
+  zeros, ones = execute(calibrationCircuits(numQubits))
+  flipUp = probabilityOfOne(zeros, numQubits)
+  stayUp = probabilityOfOne(ones, numQubits)
+
+  matrices = np.empty((numQubits, 2, 2))
+  matrices[:, 0, 0] = 1 - flipUp
+  matrices[:, 1, 0] = flipUp
+  matrices[:, 0, 1] = 1 - stayUp
+  matrices[:, 1, 1] = stayUp
+  return matrices
+
+def calibration(execute, numQubits, period = 86400, path = '.calibration'):
+  # Return the assignment matrices for the backend, from the disk cache if this backend was already calibrated in the current period.
+  # On real devices the period is the device's own calibration (its last update date); otherwise it is a fixed window of period seconds.
+  # A noisy simulator's entry also depends on its readout error, so changing the noise never loads stale matrices.
+  stamp = execute.calibrated if execute.calibrated else str(int(time.time() // period))
+  if execute.readoutError is not None:
+    stamp += '-' + hashlib.sha1(np.asarray(execute.readoutError, dtype=np.float64).tobytes()).hexdigest()[:12]
+  name = re.sub(r'[^\w.-]', '_', execute.backend + '-' + str(numQubits) + '-' + stamp) + '.npy'
+  file = os.path.join(path, name)
+
+  if os.path.exists(file):
+    calibration.hits += 1
+    return np.load(file)
+
+  calibration.misses += 1
+  matrices = calibrate(execute, numQubits)
+  os.makedirs(path, exist_ok=True)
+  np.save(file, matrices)
+  return matrices
+
+calibration.hits = 0
+calibration.misses = 0
+
+def projectSimplex(vectors):
+  # Find the nearest probability distribution (in the least squares sense) to each row of quasi-probabilities.
+  ordered = -np.sort(-vectors, axis=1)
+  totals = np.cumsum(ordered, axis=1) - 1
+  positive = ordered - totals / np.arange(1, vectors.shape[1] + 1) > 0
+  last = vectors.shape[1] - 1 - np.argmax(positive[:, ::-1], axis=1)
+  theta = totals[np.arange(len(vectors)), last] / (last + 1)
+  return np.maximum(vectors - theta[:, None], 0)
+
+def mitigate(counts, matrices):
+  # Correct a counts dictionary (or a list of them) for readout error. Returns counts of the same total, as floats.
+  batch = [counts] if isinstance(counts, dict) else counts
+  numBits = len(matrices)
+
+  measured = np.zeros((len(batch), 2 ** numBits))
+  for row, result in enumerate(batch):
+    values, weights = toArrays(result, numBits)
+    measured[row, values] = weights
+  totals = measured.sum(axis=1)
+
+  # The tensored matrix is the Kronecker product of the per-qubit matrices, so its least squares inverse is applied one qubit (axis) at a time.
+  inverses = np.linalg.pinv(matrices)
+  tensor = (measured / totals[:, None]).reshape((len(batch),) + (2,) * numBits)
+  for qubit in range(numBits):
+    axis = numBits - qubit
+    tensor = np.moveaxis(np.tensordot(inverses[qubit], tensor, axes=([1], [axis])), 0, axis)
+
+  corrected = projectSimplex(tensor.reshape(len(batch), -1)) * totals[:, None]
+
+  results = []
+  for row in corrected:
+    outcomes = np.nonzero(row > 1e-9)[0]
+    results.append({ format(outcome, '0' + str(numBits) + 'b'): float(row[outcome]) for outcome in outcomes.tolist() })
+
+  return results[0] if isinstance(counts, dict) else results
+
+def grover(password):
+  # Grover's search on a 4-bit secret key, as in search.py.
+  program = Circuit(4, 4)
+  qubits = range(4)
+
+  # Place the qubits into superposition to represent all possible values.
+  program.h(qubits)
+
+  # Run oracle on key. Invert the 0-value bits, reading the right-most bit of the key as qubit 0.
+  oracle = [len(password) - 1 - i for i in np.where(password == 0)[0]]
+  program.x(oracle)
+  program.cccz(qubits)
+  program.x(oracle)
+
+  # Amplification.
+  program.h(qubits)
+  program.x(qubits)
+  program.cccz(qubits)
+  program.x(qubits)
+  program.h(qubits)
+
+  program.measure(qubits, qubits)
+  return program
+
+def solve(execute, password, matrices = None):
+  # Re-run the search until the most frequent result is the password, returning the number of runs.
+  passwordStr = ''.join(str(bit) for bit in password)
+  for runs in range(1, maxRuns + 1):
+    counts = execute([grover(password)])[0]
+    if matrices is not None:
+      counts = mitigate(counts, matrices[execute.measured[0]])
+    if max(counts.items(), key=lambda item: item[1])[0] == passwordStr:
+      return runs
+
+  return maxRuns
+
+if __name__ == '__main__':
+  execute = executor(type, shots, READOUT_ERROR, trivialLayout = True)
+
+  # Calibrate every qubit of a real device, as the search may be measured on any of them.
+  width = execute.numQubits or 4
+  matrices = calibration(execute, width)
+  print("Assignment matrices p(measured | prepared):")
+  print(np.round(matrices, 3))
+
+  raw = []
+  mitigated = []
+  for i in range(trials):
+    password = np.random.randint(2, size=4)
+    raw.append(solve(execute, password))
+    mitigated.append(solve(execute, password, calibration(execute, width)))
+
+  print("Runs per key without mitigation: " + str(np.mean(raw)) + " (" + str(sum(raw)) + " runs for " + str(trials) + " keys)")
+  print("Runs per key with mitigation: " + str(np.mean(mitigated)) + " (" + str(sum(mitigated)) + " runs plus " + str(2 * calibration.misses) + " calibration circuits)")
+  print("Reruns avoided: " + str(sum(raw) - sum(mitigated)) + " (" + str(round(100 * (1 - sum(mitigated) / sum(raw)), 1)) + "% fewer runs). Calibration cache: " + str(calibration.hits) + " hits, " + str(calibration.misses) + " misses.")
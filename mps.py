@@ -0,0 +1,182 @@
+#
+# A matrix product state (MPS) simulator for wide circuits with little entanglement.
+# The state is stored as one small tensor per qubit, linked by bonds whose dimension grows only with the entanglement between neighbouring qubits.
+# Circuits such as the all-Hadamard random number generator or the Deutsch Jozsa algorithm with a sparse balanced oracle stay at bond dimension 1 or 2, so hundreds of qubits simulate in milliseconds where a dense statevector would need 2^n amplitudes.
+#
+# Bonds are capped at maxBond. Singular values dropped by the cap (or below the cutoff) are reported as the truncation error, the total discarded probability weight.
+# Shots are sampled directly from the MPS, one qubit at a time, for all shots at once.
+#
+# python3 mps.py
+#
+
+import time
+import numpy as np
+from circuit import Circuit, asCircuit
+from statevector import MATRICES, gates, readout, toCounts
+import statevector
+
+SWAP = MATRICES['swap'].reshape(2, 2, 2, 2)
+
+# Toffoli decomposed into gates on at most 2 qubits, as (gate, operands) on the qubits (a, b, target).
+CCX = [
+  ('h', (2,)), ('cx', (1, 2)), ('tdg', (2,)), ('cx', (0, 2)), ('t', (2,)), ('cx', (1, 2)), ('tdg', (2,)), ('cx', (0, 2)),
+  ('t', (1,)), ('t', (2,)), ('h', (2,)), ('cx', (0, 1)), ('t', (0,)), ('tdg', (1,)), ('cx', (0, 1))
+]
+
+class MPS:
+  # The state of numQubits qubits, with site i holding qubit i as a tensor of shape (left bond, 2, right bond).
+  __slots__ = ('tensors', 'center', 'maxBond', 'cutoff', 'truncationError', 'maxBondUsed')
+
+  def __init__(self, numQubits, maxBond = 64, cutoff = 1e-12):
+    zero = np.zeros((1, 2, 1), dtype=complex)
+    zero[0, 0, 0] = 1
+    self.tensors = [zero.copy() for i in range(numQubits)]
+    self.center = 0
+    self.maxBond = maxBond
+    self.cutoff = cutoff
+    self.truncationError = 0.0
+    self.maxBondUsed = 1
+
+  @property
+  def numQubits(self):
+    return len(self.tensors)
+
+  def fidelity(self):
+    # A lower bound estimate of the overlap with the exact state, given the weight discarded so far.
+    return max(0.0, 1.0 - self.truncationError)
+
+  def _moveCenter(self, site):
+    # Shift the orthogonality center with QR decompositions so that every other tensor is an isometry.
+    while self.center < site:
+      tensor = self.tensors[self.center]
+      q, r = np.linalg.qr(tensor.reshape(-1, tensor.shape[2]))
+      self.tensors[self.center] = q.reshape(tensor.shape[0], 2, -1)
+      self.tensors[self.center + 1] = np.einsum('ab,bjc->ajc', r, self.tensors[self.center + 1])
+      self.center += 1
+
+    while self.center > site:
+      tensor = self.tensors[self.center]
+      q, r = np.linalg.qr(tensor.reshape(tensor.shape[0], -1).T)
+      self.tensors[self.center] = q.T.reshape(-1, 2, tensor.shape[2])
+      self.tensors[self.center - 1] = np.einsum('ajb,bc->ajc', self.tensors[self.center - 1], r.T)
+      self.center -= 1
+
+  def apply1(self, matrix, qubit):
+    self.tensors[qubit] = np.einsum('ij,ajb->aib', matrix, self.tensors[qubit])
+
+  def _applyAdjacent(self, matrix, site):
+    # Apply a 2-qubit matrix of shape (2, 2, 2, 2) to sites (site, site + 1), then split them again with a truncated SVD.
+    self._moveCenter(site)
+    left = self.tensors[site]
+    right = self.tensors[site + 1]
+    theta = np.einsum('aib,bjc->aijc', left, right)
+    theta = np.einsum('ijkl,aklc->aijc', matrix, theta)
+
+    u, s, vh = np.linalg.svd(theta.reshape(left.shape[0] * 2, 2 * right.shape[2]), full_matrices=False)
+
+    weights = s ** 2
+    total = weights.sum()
+    keep = max(1, min(self.maxBond, int(np.count_nonzero(weights > self.cutoff * total))))
+    self.truncationError += float(weights[keep:].sum() / total)
+    self.maxBondUsed = max(self.maxBondUsed, keep)
+
+    s = s[:keep] / np.sqrt(weights[:keep].sum())
+    self.tensors[site] = u[:, :keep].reshape(left.shape[0], 2, keep)
+    self.tensors[site + 1] = (s[:, None] * vh[:keep]).reshape(keep, 2, right.shape[2])
+    self.center = site + 1
+
+  def apply2(self, matrix, a, b):
+    # Apply a 2-qubit matrix to any pair of qubits, swapping b next to a and back again when they are not neighbours.
+    matrix = matrix.reshape(2, 2, 2, 2)
+    if a > b:
+      matrix = matrix.transpose(1, 0, 3, 2)
+      a, b = b, a
+
+    for site in range(b - 1, a, -1):
+      self._applyAdjacent(SWAP, site)
+    self._applyAdjacent(matrix, a)
+    for site in range(a + 1, b):
+      self._applyAdjacent(SWAP, site)
+
+  def apply(self, name, qubits, matrix):
+    if len(qubits) == 1:
+      self.apply1(matrix, qubits[0])
+    elif len(qubits) == 2:
+      self.apply2(matrix, qubits[0], qubits[1])
+    elif name == 'ccx':
+      for gate, operands in CCX:
+        self.apply(gate, [qubits[i] for i in operands], MATRICES[gate])
+    else:
+      raise ValueError('Unsupported gate for the MPS simulator: ' + name)
+
+  def sample(self, shots, rng):
+    # Draw shots from the state, qubit by qubit from site 0, carrying one left environment vector per shot.
+    self._moveCenter(0)
+    bits = np.empty((shots, self.numQubits), dtype=np.uint8)
+    environment = np.ones((shots, 1), dtype=complex)
+    rows = np.arange(shots)
+
+    for site, tensor in enumerate(self.tensors):
+      amplitudes = np.einsum('sa,aib->sib', environment, tensor)
+      probabilities = np.sum(np.abs(amplitudes) ** 2, axis=2)
+      ones = rng.random(shots) * probabilities.sum(axis=1) < probabilities[:, 1]
+      bits[:, site] = ones
+      environment = amplitudes[rows, ones.astype(np.int64)] / np.sqrt(probabilities[rows, ones.astype(np.int64)])[:, None]
+
+    return bits
+
+def simulate(program, maxBond = 64, cutoff = 1e-12):
+  # Run the unitary part of a program and return the MPS and the measurements.
+  program = asCircuit(program)
+  operations, measured = gates(program)
+
+  state = MPS(program.numQubits, maxBond, cutoff)
+  for name, qubits, matrix in operations:
+    state.apply(name, qubits, matrix)
+
+  return state, measured
+
+def execute(program, shots = 1024, maxBond = 64, cutoff = 1e-12, readoutError = None, seed = None):
+  # Simulate a program and sample measurement counts. The final MPS (with its truncation error) is kept in execute.state.
+  program = asCircuit(program)
+  rng = np.random.default_rng(seed)
+  state, (qubits, clbits) = simulate(program, maxBond, cutoff)
+  execute.state = state
+
+  bits = readout(state.sample(shots, rng)[:, qubits], qubits, readoutError, rng)
+  return toCounts(bits, clbits, program.numClbits)
+
+execute.state = None
+
+def randomNumber(n):
+  # The all-Hadamard circuit from random-number.py.
+  program = Circuit(n, n)
+  program.h(range(n))
+  program.measure(range(n), range(n))
+  return program
+
+def benchmark(sizes = [20, 50, 100, 200], shots = 1024, denseLimit = 22):
+  # Compare the MPS simulator against the dense statevector simulator on the example circuits.
+  # The Deutsch Jozsa circuit uses the balanced oracle with a CNOT from each input qubit i where bit i of n is set.
+  for name, build in [('random number', randomNumber), ('deutsch jozsa', lambda n: statevector.deutschJozsa(n, n))]:
+    print("Circuit: " + name)
+    for n in sizes:
+      program = build(n)
+
+      start = time.time()
+      counts = execute(program, shots)
+      elapsed = time.time() - start
+      state = execute.state
+      line = "  " + str(program.numQubits) + " qubits: mps " + str(round(elapsed, 4)) + "s (bond " + str(state.maxBondUsed) + ", truncation error " + ('%.1e' % state.truncationError) + ", " + str(len(counts)) + " outcomes)"
+
+      if program.numQubits <= denseLimit:
+        start = time.time()
+        statevector.execute(program, shots)
+        line += ", dense " + str(round(time.time() - start, 4)) + "s"
+      else:
+        line += ", dense needs " + ('%.3g' % (2 ** program.numQubits * 16 / 2 ** 30)) + " GB for the state"
+
+      print(line)
+
+if __name__ == '__main__':
+  benchmark()
@@ -0,0 +1,296 @@
+#
+# Pack several small circuits into one wide circuit, so they share a single job (and a single wait in the queue) on a quantum computer.
+# hello.py and basic.py use 1 qubit, clone.py and superposition.py use 2, and 8ball.py uses 3, while the device has many more. Each program normally waits in the queue on its own.
+#
+# Each circuit is placed on its own disjoint set of physical qubits, such that every pair of qubits it entangles is connected in the backend's coupling map, and on its own range of classical bits.
+# The packed circuit is submitted once, and the counts are split back into the marginal counts of each original circuit.
+# The report gives the number of jobs saved and an estimate of the queue time saved, taking the time of each packed job as the wait each extra circuit would otherwise have paid.
+#
+# python3 packer.py
+#
+
+import time
+import numpy as np
+from circuit import Circuit, ARITY, OPCODES
+from backends import executor
+
+type = 'mps' # Run program on the matrix product state simulator (mps) or real quantum machine (real).
+shots = 1024 # Number of measurements (shots) per job.
+
+# A Toffoli gate (controls 0 and 1, target 2) as H, a controlled controlled Z from T gates on every parity of the three qubits, then H, with CNOTs only between the target and each control.
+# It runs on the path control-target-control, so a Toffoli never needs the transpiler to route it through qubits of another packed circuit.
+TOFFOLI = [
+  ('h', (2,)),
+  ('t', (0,)),
+  ('t', (2,)),
+  ('t', (1,)),
+  ('cx', (0, 2)),
+  ('tdg', (2,)),
+  ('cx', (2, 1)),
+  ('t', (1,)),
+  ('cx', (0, 2)),
+  ('cx', (2, 1)),
+  ('tdg', (1,)),
+  ('cx', (0, 2)),
+  ('cx', (2, 1)),
+  ('tdg', (1,)),
+  ('cx', (0, 2)),
+  ('cx', (2, 1)),
+  ('h', (2,))
+]
+
+def ladder(columns):
+  # A coupling map of two rows of qubits, connected along each row and across each column (like the 16 qubit IBM Q devices).
+  edges = []
+  for column in range(columns - 1):
+    edges += [[column, column + 1], [columns + column, columns + column + 1]]
+  return edges + [[column, columns + column] for column in range(columns)]
+
+def adjacencyOf(couplingMap, numQubits):
+  # Undirected neighbours of each physical qubit; the direction of a CNOT is left to the transpiler.
+  adjacency = [set() for i in range(numQubits)]
+  for a, b in couplingMap:
+    adjacency[a].add(b)
+    adjacency[b].add(a)
+  return adjacency
+
+def interactions(program):
+  # Neighbours of each qubit in the circuit: the qubits it shares a multi-qubit gate with.
+  # A Toffoli gate only needs its target next to both controls (a path), as devices such as the ladder or heavy hex have no triangles of qubits; pathToffoli() rewrites it to match.
+  graph = [set() for i in range(program.numQubits)]
+  for op, qubits in zip(program.ops.tolist(), program.qubits.tolist()):
+    operands = qubits[:ARITY[op]]
+    for control in operands[:-1]:
+      graph[control].add(operands[-1])
+      graph[operands[-1]].add(control)
+  return graph
+
+def pathToffoli(program):
+  # Replace each Toffoli gate with the TOFFOLI sequence, which only uses the pairs interactions() placed next to each other.
+  if not np.any(program.ops == OPCODES['ccx']):
+    return program
+
+  result = Circuit(program.numQubits, program.numClbits)
+  for gate in program:
+    if gate.name == 'ccx':
+      for name, operands in TOFFOLI:
+        result.layer(name, [gate.qubits[i] for i in operands])
+    elif gate.name == 'barrier':
+      result.barrier()
+    elif gate.name == 'measure':
+      result.measure(gate.qubits[0], gate.clbit)
+    else:
+      result.layer(gate.name, gate.qubits, gate.params)
+  return result
+
+def place(program, adjacency, free):
+  # Map each qubit of the circuit to a free physical qubit so that interacting qubits are neighbours on the device, or return None.
+  if len(free) < program.numQubits:
+    return None
+
+  graph = interactions(program)
+
+  # Visit the qubits breadth first from the most connected, so each qubit (after the first in its group) already has a placed neighbour.
+  order = []
+  for root in sorted(range(program.numQubits), key=lambda q: -len(graph[q])):
+    if root in order:
+      continue
+    order.append(root)
+    pending = [root]
+    while pending:
+      for neighbour in sorted(graph[pending.pop(0)]):
+        if not neighbour in order:
+          order.append(neighbour)
+          pending.append(neighbour)
+
+  placement = {}
+  used = set()
+
+  def search(k):
+    if k == len(order):
+      return True
+
+    qubit = order[k]
+    placedNeighbours = [placement[q] for q in graph[qubit] if q in placement]
+    candidates = set(free) - used
+    for physical in placedNeighbours:
+      candidates &= adjacency[physical]
+
+    # Prefer physical qubits next to the ones this circuit already uses, to keep each circuit compact.
+    for physical in sorted(candidates, key=lambda p: (not adjacency[p] & used, p)):
+      placement[qubit] = physical
+      used.add(physical)
+      if search(k + 1):
+        return True
+      del placement[qubit]
+      used.discard(physical)
+
+    return False
+
+  return [placement[q] for q in range(program.numQubits)] if search(0) else None
+
+class Job:
+  # A wide circuit holding several small circuits, each with its physical qubits and its first classical bit.
+  __slots__ = ('free', 'entries', 'program')
+
+  def __init__(self, numQubits):
+    self.free = set(range(numQubits))
+    self.entries = []
+    self.program = None
+
+  def add(self, index, program, qubits):
+    self.free -= set(qubits)
+    offset = sum(len(entry[2]) for entry in self.entries)
+    self.entries.append((index, qubits, list(range(offset, offset + program.numClbits))))
+
+  def build(self, circuits, numQubits):
+    self.program = Circuit(numQubits, sum(len(clbits) for index, qubits, clbits in self.entries))
+    for index, qubits, clbits in self.entries:
+      self.program.compose(pathToffoli(circuits[index]), qubits, clbits)
+    return self.program
+
+  def split(self, counts):
+    # Return the marginal counts of each circuit in the job, keyed by its index.
+    keys = [key.replace(' ', '') for key in counts.keys()]
+    width = self.program.numClbits
+    bits = np.frombuffer(''.join(keys).encode(), dtype=np.uint8).reshape(len(keys), width)
+    weights = np.array(list(counts.values()))
+
+    results = {}
+    for index, qubits, clbits in self.entries:
+      # A circuit without classical bits has nothing to count.
+      if not clbits:
+        results[index] = {}
+        continue
+
+      # Clbit 0 is the right-most character of a key.
+      columns = bits[:, width - clbits[0] - len(clbits):width - clbits[0]]
+      outcomes, inverse = np.unique(columns, axis=0, return_inverse=True)
+      totals = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(outcomes))
+      results[index] = { outcome.tobytes().decode(): int(total) for outcome, total in zip(outcomes, totals.tolist()) }
+
+    return results
+
+def pack(circuits, numQubits, couplingMap):
+  # Place the circuits, largest first, into as few jobs as possible.
+  adjacency = adjacencyOf(couplingMap, numQubits)
+  jobs = []
+  for index in sorted(range(len(circuits)), key=lambda i: -circuits[i].numQubits):
+    program = circuits[index]
+    for job in jobs:
+      qubits = place(program, adjacency, job.free)
+      if qubits is not None:
+        job.add(index, program, qubits)
+        break
+    else:
+      if program.numQubits > numQubits:
+        raise ValueError('Circuit ' + str(index) + ' with ' + str(program.numQubits) + ' qubits is wider than the ' + str(numQubits) + ' qubit device')
+      job = Job(numQubits)
+      qubits = place(program, adjacency, job.free)
+      if qubits is None:
+        raise ValueError('Circuit ' + str(index) + ' with ' + str(program.numQubits) + ' qubits does not fit on the coupling map (each pair of qubits in a two qubit gate, and each Toffoli target with its controls, must be neighbours)')
+      job.add(index, program, qubits)
+      jobs.append(job)
+
+  for job in jobs:
+    job.build(circuits, numQubits)
+  return jobs
+
+class Report:
+  # Jobs submitted for a set of circuits, and the queue time saved by packing them.
+  __slots__ = ('circuits', 'jobs', 'seconds', 'secondsSaved')
+
+  def __init__(self, circuits):
+    self.circuits = circuits
+    self.jobs = 0
+    self.seconds = 0.0
+    self.secondsSaved = 0.0
+
+  def __repr__(self):
+    return str(self.circuits) + " circuits in " + str(self.jobs) + " jobs (" + str(self.circuits - self.jobs) + " jobs saved), " + str(round(self.seconds, 2)) + "s waiting for results, about " + str(round(self.secondsSaved, 2)) + "s of queue time saved"
+
+def run(circuits, execute, numQubits = None, couplingMap = None):
+  # Execute the circuits packed onto the backend and return the counts of each circuit with the report.
+  # numQubits and couplingMap default to the device's own. Simulators have neither: numQubits must be given, and any qubits may interact unless a couplingMap is given.
+  numQubits = numQubits or execute.numQubits
+  if numQubits is None:
+    raise ValueError('The ' + execute.backend + ' backend has no qubit count, so numQubits must be given')
+  if couplingMap is None:
+    couplingMap = execute.couplingMap if execute.couplingMap is not None else [[a, b] for a in range(numQubits) for b in range(a + 1, numQubits)]
+  jobs = pack(circuits, numQubits, couplingMap)
+
+  results = [None] * len(circuits)
+  report = Report(len(circuits))
+  for job in jobs:
+    start = time.time()
+    counts = execute([job.program])[0]
+    elapsed = time.time() - start
+
+    for index, marginal in job.split(counts).items():
+      results[index] = marginal
+
+    report.jobs += 1
+    report.seconds += elapsed
+    report.secondsSaved += elapsed * (len(job.entries) - 1)
+
+  return results, report
+
+def hello():
+  # hello.py and basic.py: measure a single qubit.
+  program = Circuit(1, 1)
+  program.measure(0, 0)
+  return program
+
+def eightBall():
+  # 8ball.py: 3 qubits in superposition.
+  program = Circuit(3, 3)
+  program.h(range(3))
+  program.measure(range(3), range(3))
+  return program
+
+def clone():
+  # clone.py: copy a qubit in superposition to a second qubit.
+  program = Circuit(2, 2)
+  program.x(0)
+  program.h(0)
+  program.h(0)
+  program.cx(0, 1)
+  program.h([0, 1])
+  program.h([0, 1])
+  program.measure([0, 1], [0, 1])
+  return program
+
+def bell():
+  # superposition.py Example 2: a Bell state.
+  program = Circuit(2, 2)
+  program.h(0)
+  program.cx(0, 1)
+  program.x(0)
+  program.measure([0, 1], [0, 1])
+  return program
+
+def superdense():
+  # superposition.py Example 3: send 01 with superdense coding.
+  program = Circuit(2, 2)
+  program.h(0)
+  program.cx(0, 1)
+  program.x(0)
+  program.cx(0, 1)
+  program.h(0)
+  program.measure([0, 1], [0, 1])
+  return program
+
+if __name__ == '__main__':
+  names = ['hello', 'basic', '8ball', 'clone', 'bell', 'superdense']
+  circuits = [hello(), hello(), eightBall(), clone(), bell(), superdense()]
+
+  execute = executor(type, shots, trivialLayout = True)
+  if type == 'real':
+    results, report = run(circuits, execute)
+  else:
+    # Simulate a 16 qubit device.
+    results, report = run(circuits, execute, 16, ladder(8))
+
+  for name, counts in zip(names, results):
+    print(name + ": " + str(counts))
+  print(report)
@@ -15,8 +15,9 @@ from qiskit import ClassicalRegister, QuantumRegister, QuantumCircuit
 from qiskit import IBMQ
 from configparser import RawConfigParser
 import math
+import mps
 
-type = 'sim' # Run program on the simulator or real quantum machine.
+type = 'sim' # Run program on the simulator, the matrix product state simulator (mps), or real quantum machine.
 
 def run(program, type, shots = 1, silent = False):
   if type == 'real':
@@ -34,6 +35,11 @@ def run(program, type, shots = 1, silent = False):
       print("Running on", backend.name())
     job = qiskit.execute(program, backend)
     return job.result().get_counts()
+  elif type == 'mps':
+    # Execute the program in the matrix product state simulator, suited to wide circuits with little entanglement.
+    if not silent:
+      print("Running on the MPS simulator.")
+    return mps.execute(program, shots)
   else:
     # Execute the program in the simulator.
     if not silent:
@@ -0,0 +1,258 @@
+#
+# A dense statevector simulator for circuits built with circuit.py (or qiskit circuits, converted on the way in).
+# The state of n qubits is held as 2^n complex amplitudes, so memory and time grow exponentially with the number of qubits.
+# Measurements are treated as happening at the end of the program, as in all of the example programs.
+#
+# Bit ordering follows qiskit: qubit 0 is the right-most bit of an outcome, and counts are keyed by the classical bits.
+#
+# Programs that share a long identical prefix (the Hadamard layer of search.py, everything before the oracle in deutsch_jozsa.py) can pass a PrefixCache.
+# Intermediate states are stored under a hash of the gates that produced them, and a new program resumes from the longest prefix found in the cache instead of from |0...0>.
+#
+# python3 statevector.py
+#
+
+import hashlib
+import time
+from collections import OrderedDict
+import numpy as np
+from circuit import Circuit, NAMES, ARITY, OPCODES, PARAMS, asCircuit
+
+SQRT2 = np.sqrt(2)
+
+# Fixed gate matrices. Multi-qubit matrices use the first operand as the most significant bit.
+MATRICES = {
+  'id': np.eye(2, dtype=complex),
+  'x': np.array([[0, 1], [1, 0]], dtype=complex),
+  'y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+  'z': np.array([[1, 0], [0, -1]], dtype=complex),
+  'h': np.array([[1, 1], [1, -1]], dtype=complex) / SQRT2,
+  's': np.array([[1, 0], [0, 1j]], dtype=complex),
+  'sdg': np.array([[1, 0], [0, -1j]], dtype=complex),
+  't': np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=complex),
+  'tdg': np.array([[1, 0], [0, np.exp(-1j * np.pi / 4)]], dtype=complex),
+  'cx': np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex),
+  'cz': np.diag([1, 1, 1, -1]).astype(complex),
+  'swap': np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex),
+  'ccx': np.eye(8, dtype=complex)[[0, 1, 2, 3, 4, 5, 7, 6]]
+}
+
+def unitary(name, params = ()):
+  # Return the matrix for a gate, using the qiskit definitions of the u1, u2 and u3 rotations.
+  if name in MATRICES:
+    return MATRICES[name]
+  elif name == 'u1' or name == 'cu1':
+    phase = np.exp(1j * params[0])
+    return np.diag([1, phase]) if name == 'u1' else np.diag([1, 1, 1, phase])
+  elif name == 'u2' or name == 'u3':
+    theta, phi, lam = (np.pi / 2, params[0], params[1]) if name == 'u2' else params[:3]
+    return np.array([
+      [np.cos(theta / 2), -np.exp(1j * lam) * np.sin(theta / 2)],
+      [np.exp(1j * phi) * np.sin(theta / 2), np.exp(1j * (phi + lam)) * np.cos(theta / 2)]
+    ])
+  else:
+    raise ValueError('No matrix for gate: ' + name)
+
+def gates(program):
+  # Split a program into its unitary gates (name, qubits, matrix) and its final measurements (qubits, clbits).
+  measured = {}
+  operations = []
+  for op, qubits, params, clbit in zip(program.ops.tolist(), program.qubits.tolist(), program.params.tolist(), program.clbits.tolist()):
+    name = NAMES[op]
+    if name == 'measure':
+      measured[qubits[0]] = clbit
+    elif name == 'barrier' or name == 'id':
+      continue
+    else:
+      qubits = qubits[:ARITY[op]]
+      if any(q in measured for q in qubits):
+        raise ValueError('Gates after a measurement are not supported: ' + name + ' on ' + str(qubits))
+      operations.append((name, qubits, unitary(name, params[:PARAMS[op]])))
+
+  return operations, (np.array(list(measured.keys()), dtype=np.int64), np.array(list(measured.values()), dtype=np.int64))
+
+def applyGate(state, matrix, qubits):
+  # Apply a k-qubit matrix to a state tensor of shape (2,) * n, where qubit q lives on axis n - 1 - q.
+  k = len(qubits)
+  axes = [state.ndim - 1 - q for q in qubits]
+  state = np.tensordot(matrix.reshape((2,) * (2 * k)), state, axes=(list(range(k, 2 * k)), axes))
+  return np.moveaxis(state, list(range(k)), axes)
+
+class PrefixCache:
+  # A memory-bounded LRU cache of intermediate states, keyed by a running hash of the gates applied since |0...0>.
+  __slots__ = ('budget', 'bytes', 'entries', 'lookups', 'hits', 'evictions', 'gatesSkipped', 'gatesSimulated', 'secondsSaved')
+
+  def __init__(self, budget = 256 * 2 ** 20):
+    self.budget = budget
+    self.bytes = 0
+    self.entries = OrderedDict()
+    self.lookups = 0
+    self.hits = 0
+    self.evictions = 0
+    self.gatesSkipped = 0
+    self.gatesSimulated = 0
+    self.secondsSaved = 0.0
+
+  def hitRate(self):
+    return self.hits / self.lookups if self.lookups else 0.0
+
+  def __repr__(self):
+    return "Prefix cache: " + str(self.hits) + "/" + str(self.lookups) + " hits (" + str(round(100 * self.hitRate(), 1)) + "%), " + str(self.gatesSkipped) + " gates skipped, " + str(self.gatesSimulated) + " simulated, " + str(round(self.secondsSaved, 3)) + "s saved, " + str(len(self.entries)) + " states in " + str(round(self.bytes / 2 ** 20, 1)) + " MB, " + str(self.evictions) + " evicted"
+
+  def keys(self, numQubits, operations):
+    # Hash every prefix of the program; keys[i] identifies the state after the first i gates.
+    digest = hashlib.blake2b(str(numQubits).encode(), digest_size=16).digest()
+    keys = [digest]
+    for name, qubits, matrix in operations:
+      digest = hashlib.blake2b(digest + name.encode() + np.array(qubits, dtype=np.int32).tobytes() + matrix.tobytes(), digest_size=16).digest()
+      keys.append(digest)
+
+    return keys
+
+  def find(self, keys):
+    # Return the length of the longest cached prefix with its state and the seconds it took to compute, or (0, None, 0).
+    self.lookups += 1
+    for length in range(len(keys) - 1, 0, -1):
+      if keys[length] in self.entries:
+        self.entries.move_to_end(keys[length])
+        state, seconds = self.entries[keys[length]]
+        self.hits += 1
+        self.gatesSkipped += length
+        self.secondsSaved += seconds
+        return length, state, seconds
+
+    return 0, None, 0.0
+
+  def store(self, key, state, seconds, keep = ()):
+    # Keep a state, evicting the least recently used ones to stay within the memory budget.
+    # The keys in keep (the prefixes the state was built on) are never evicted for it: a program's deeper states are unique to it, while its prefix is shared with the next program.
+    if key in self.entries:
+      self.entries.move_to_end(key)
+      return
+
+    victims = []
+    needed = self.bytes + state.nbytes - self.budget
+    for old, (oldState, oldSeconds) in self.entries.items():
+      if needed <= 0:
+        break
+      if not old in keep:
+        victims.append(old)
+        needed -= oldState.nbytes
+    if needed > 0:
+      return
+
+    for old in victims:
+      oldState, oldSeconds = self.entries.pop(old)
+      self.bytes -= oldState.nbytes
+      self.evictions += 1
+
+    state.setflags(write=False)
+    self.entries[key] = (state, seconds)
+    self.bytes += state.nbytes
+
+def checkpoints(program, operations):
+  # Gate counts after which to store the state: every barrier, the end of each layer (a run of 2 or more of the same gate), and the end of the program.
+  names = [name for name, qubits, matrix in operations]
+  points = set(i + 1 for i in range(1, len(names)) if names[i] == names[i - 1] and (i + 1 == len(names) or names[i + 1] != names[i]))
+  points.add(len(names))
+
+  ops = program.ops
+  unitary = ~np.isin(ops, [OPCODES['measure'], OPCODES['barrier'], OPCODES['id']])
+  points.update(np.cumsum(unitary)[ops == OPCODES['barrier']].tolist())
+  points.discard(0)
+  return points
+
+def simulate(program, cache = None):
+  # Run the unitary part of a program from |0...0> (or the longest cached prefix) and return the final state (qiskit ordering) and the measurements.
+  program = asCircuit(program)
+  operations, measured = gates(program)
+
+  state = np.zeros((2,) * program.numQubits, dtype=complex)
+  state[(0,) * program.numQubits] = 1
+  if cache is None:
+    for name, qubits, matrix in operations:
+      state = applyGate(state, matrix, qubits)
+    return state.reshape(-1), measured
+
+  keys = cache.keys(program.numQubits, operations)
+  points = checkpoints(program, operations)
+  length, cached, seconds = cache.find(keys)
+  if cached is not None:
+    state = cached
+
+  # The states already cached along this program's path are kept when its deeper states are stored.
+  path = set(keys[1:length + 1])
+  start = time.time()
+  for i in range(length, len(operations)):
+    name, qubits, matrix = operations[i]
+    state = applyGate(state, matrix, qubits)
+    if i + 1 in points:
+      cache.store(keys[i + 1], state, seconds + time.time() - start, path)
+      path.add(keys[i + 1])
+
+  cache.gatesSimulated += len(operations) - length
+  return state.reshape(-1), measured
+
+def readout(bits, qubits, readoutError, rng):
+  # Flip measured bits with the assignment error of each qubit. readoutError is a pair [p(1|0), p(0|1)] for every qubit, or one pair per qubit.
+  if readoutError is None:
+    return bits
+
+  errors = np.asarray(readoutError, dtype=np.float64)
+  errors = errors[qubits] if errors.ndim == 2 else np.broadcast_to(errors, (len(qubits), 2))
+  flip = rng.random(bits.shape) < np.where(bits == 1, errors[:, 1], errors[:, 0])
+  return bits ^ flip
+
+def toCounts(bits, clbits, numClbits):
+  # Place sampled bits (shots, measured qubits) into the classical register, with clbit 0 right-most, and count each outcome.
+  register = np.zeros((len(bits), numClbits), dtype=np.uint8)
+  register[:, numClbits - 1 - clbits] = bits
+
+  outcomes, counts = np.unique(register, axis=0, return_counts=True)
+  return { (outcome + ord('0')).tobytes().decode(): int(count) for outcome, count in zip(outcomes, counts.tolist()) }
+
+def execute(program, shots = 1024, readoutError = None, seed = None, cache = None):
+  # Simulate a program and sample measurement counts, resuming from the prefix cache when one is given.
+  program = asCircuit(program)
+  rng = np.random.default_rng(seed)
+  state, (qubits, clbits) = simulate(program, cache)
+
+  probabilities = np.abs(state) ** 2
+  outcomes = rng.choice(len(probabilities), size=shots, p=probabilities / probabilities.sum())
+  bits = ((outcomes[:, None] >> qubits[None, :]) & 1).astype(np.uint8)
+  bits = readout(bits, qubits, readoutError, rng)
+
+  return toCounts(bits, clbits, program.numClbits)
+
+def deutschJozsa(n, oracle):
+  # The Deutsch Jozsa circuit from deutsch_jozsa.py. The oracle is 0 or 1 for a constant function, otherwise the bitmask of the input qubits in a balanced function.
+  program = Circuit(n + 1, n)
+  program.h(range(n))
+  program.x(n)
+  program.h(n)
+  program.barrier()
+  if oracle == 1:
+    program.x(n)
+  elif oracle > 1:
+    program.cx([i for i in range(n) if oracle & (1 << i)], n)
+  program.barrier()
+  program.h(range(n))
+  program.measure(range(n), range(n))
+  return program
+
+def benchmark(n = 17, runs = 20):
+  # Simulate Deutsch Jozsa circuits with random oracles, without the prefix cache, with the default cache and with a cache that only has room for two states.
+  oracles = np.random.randint(2 ** n, size=runs)
+
+  start = time.time()
+  for oracle in oracles:
+    execute(deutschJozsa(n, oracle))
+  print(str(runs) + " Deutsch Jozsa circuits on " + str(n + 1) + " qubits: " + str(round(time.time() - start, 3)) + "s without the cache.")
+
+  for name, cache in [('the cache', PrefixCache()), ('a budget of two states', PrefixCache(2 * 16 * 2 ** (n + 1)))]:
+    start = time.time()
+    for oracle in oracles:
+      execute(deutschJozsa(n, oracle), cache = cache)
+    print(str(round(time.time() - start, 3)) + "s with " + name + ". " + str(cache))
+
+if __name__ == '__main__':
+  benchmark()
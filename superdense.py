@@ -0,0 +1,191 @@
+#
+# A streaming version of the superdense coding protocol from Example 3 of superposition.py, sending an arbitrary stream of bytes two bits at a time.
+# Each byte is split into four 2-bit symbols. Alice encodes a symbol onto her half of a Bell pair with the table below, Bob reverses the entanglement and measures, and the measured bits are decoded back into the symbol.
+#
+# 00  I  - Identity nothing to do
+# 01  X  - program.x(qr[0])
+# 10  Z  - program.z(qr[0])
+# 11  XZ - program.x(qr[0]) program.z(qr[0])
+#
+# Symbols move through three stages (encode, execute, decode) on separate threads, connected by bounded queues, so batches of circuits are executing while the next batch is encoded and the last one is decoded and verified.
+# The report gives the throughput in bits/second and the symbol error rate, for sizing the protocol against the simulator or a noisy backend.
+#
+# python3 superdense.py
+#
+
+import queue
+import threading
+import time
+import numpy as np
+from circuit import Circuit
+from backends import executor
+
+type = 'sim' # Run program on the simulator (sim), the simulator with readout noise (noisy), the qiskit simulator (aer) or real quantum machine (real).
+shots = 1 # Number of measurements per symbol; with more than one, Bob decodes the most frequent outcome.
+
+# Gates Alice applies to her qubit for each 2-bit symbol.
+ENCODING = [[], ['x'], ['z'], ['x', 'z']]
+
+# Bob reads Alice's qubit qr[0] as the right-most bit and his own qubit qr[1] as the left-most bit, giving the symbol bits in reverse order.
+DECODING = { '00': 0, '10': 1, '01': 2, '11': 3 }
+
+def encode(symbol):
+  # Build the superdense coding circuit for one 2-bit symbol.
+  program = Circuit(2, 2)
+
+  # Sender: Create a Bell pair from qr[0] and qr[1].
+  program.h(0)
+  program.cx(0, 1)
+
+  # Sender: Encode the symbol onto qr[0].
+  for gate in ENCODING[symbol]:
+    getattr(program, gate)(0)
+
+  # Receiver: Reverse the entanglement and the superposition, then measure.
+  program.cx(0, 1)
+  program.h(0)
+  program.measure([0, 1], [0, 1])
+
+  return program
+
+# The four circuits are fixed, so they are built once and shared by every symbol.
+CIRCUITS = [encode(symbol) for symbol in range(4)]
+
+def decode(counts):
+  # Take the most frequent outcome as the received symbol.
+  return DECODING[max(counts.items(), key=lambda item: item[1])[0]]
+
+def toSymbols(data):
+  # Split bytes into 2-bit symbols, most significant first.
+  bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8)).reshape(-1, 2)
+  return bits[:, 0] * 2 + bits[:, 1]
+
+def toBytes(symbols):
+  # Join 2-bit symbols (four per byte) back into bytes.
+  symbols = np.asarray(symbols, dtype=np.uint8)
+  return np.packbits(np.column_stack([symbols >> 1, symbols & 1]).reshape(-1)).tobytes()
+
+class Stats:
+  # Running totals for a transmission.
+  __slots__ = ('symbols', 'errors', 'batches', 'seconds')
+
+  def __init__(self):
+    self.symbols = 0
+    self.errors = 0
+    self.batches = 0
+    self.seconds = 0.0
+
+  def bitsPerSecond(self):
+    return 2 * self.symbols / self.seconds if self.seconds else 0.0
+
+  def symbolErrorRate(self):
+    return self.errors / self.symbols if self.symbols else 0.0
+
+  def __repr__(self):
+    return str(self.symbols * 2) + " bits in " + str(self.batches) + " batches, " + str(round(self.seconds, 3)) + "s, " + str(round(self.bitsPerSecond(), 1)) + " bits/second, symbol error rate " + str(round(self.symbolErrorRate(), 5))
+
+def stream(chunks, execute, batchSize = 256, depth = 4, stats = None):
+  # Send an iterable of byte strings through the protocol, yielding the bytes Bob decodes for each batch as they arrive.
+  # batchSize is the number of symbols (circuits) per job, and depth bounds how many batches may wait between stages.
+  if batchSize % 4:
+    raise ValueError('batchSize must be a multiple of 4 symbols (one byte)')
+
+  stats = stats if stats is not None else Stats()
+  encoded = queue.Queue(maxsize=depth)
+  executed = queue.Queue(maxsize=depth)
+  stop = threading.Event()
+
+  def put(target, item):
+    # Wait for room in a queue, giving up once the consumer has stopped reading.
+    while not stop.is_set():
+      try:
+        target.put(item, timeout=0.1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def encoder():
+    # Alice: split the stream into symbols and batches of circuits.
+    try:
+      for chunk in chunks:
+        symbols = toSymbols(chunk)
+        for i in range(0, len(symbols), batchSize):
+          batch = symbols[i:i + batchSize]
+          if not put(encoded, (batch, [CIRCUITS[symbol] for symbol in batch.tolist()])):
+            return
+      put(encoded, None)
+    except Exception as error:
+      put(encoded, error)
+
+  def runner():
+    # Execute each batch of circuits as it becomes available, submitting nothing more once the consumer has stopped.
+    while not stop.is_set():
+      try:
+        item = encoded.get(timeout=0.1)
+      except queue.Empty:
+        continue
+      if item is None or isinstance(item, Exception):
+        put(executed, item)
+        return
+      try:
+        symbols, circuits = item
+        result = (symbols, execute(circuits))
+      except Exception as error:
+        put(executed, error)
+        return
+      if not put(executed, result):
+        return
+
+  start = time.time()
+  threads = [threading.Thread(target=encoder, daemon=True), threading.Thread(target=runner, daemon=True)]
+  for thread in threads:
+    thread.start()
+
+  # Bob: decode and verify each batch on the fly.
+  try:
+    while True:
+      item = executed.get()
+      if item is None:
+        break
+      if isinstance(item, Exception):
+        raise item
+
+      sent, counts = item
+      received = np.array([decode(result) for result in counts], dtype=np.uint8)
+      stats.symbols += len(sent)
+      stats.errors += int(np.count_nonzero(received != sent))
+      stats.batches += 1
+      stats.seconds = time.time() - start
+      yield toBytes(received)
+  finally:
+    # Stop the workers whether the stream finished, failed, or was closed early, then drain the queues so no put is left waiting.
+    # A batch already executing is allowed to finish before the runner exits.
+    stop.set()
+    for pending in [encoded, executed]:
+      while True:
+        try:
+          pending.get_nowait()
+        except queue.Empty:
+          break
+    for thread in threads:
+      thread.join()
+
+def transmit(data, execute, batchSize = 256, depth = 4, chunkSize = 1024):
+  # Send a byte string and return the bytes received with the transmission stats.
+  stats = Stats()
+  chunks = (data[i:i + chunkSize] for i in range(0, len(data), chunkSize))
+  received = b''.join(stream(chunks, execute, batchSize, depth, stats))
+  return received, stats
+
+if __name__ == '__main__':
+  message = b'Superdense coding sends two classical bits by manipulating a single qubit. ' * 8
+
+  received, stats = transmit(message, executor(type, shots))
+  print("Sent " + str(len(message)) + " bytes on '" + type + "': " + str(stats))
+  print("Received: " + received[:75].decode(errors='replace'))
+
+  if type == 'sim':
+    received, stats = transmit(message, executor('noisy', shots))
+    print("Sent " + str(len(message)) + " bytes on 'noisy': " + str(stats))
+    print("Received: " + received[:75].decode(errors='replace'))